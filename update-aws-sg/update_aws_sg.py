@@ -0,0 +1,235 @@
+import argparse
+import ipaddress
+import json
+import sys
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set, Tuple
+
+import boto3
+
+# 設定ファイルの形式は sg_config.example.json を参照。
+# 同じ SG に対する複数のエントリ (tcp と udp など) は 1 つにまとめて reconcile する。
+#
+# description が一致するルールだけをこのスクリプトの管理対象とみなし、
+# それ以外の手動で追加されたルールには触れない。
+
+CHECKIP_URL = "https://checkip.amazonaws.com/"
+DEFAULT_DESCRIPTION = "update-aws-sg"
+
+# (protocol, from_port, to_port, cidr)
+Rule = Tuple[str, int, int, str]
+
+
+def validate_ip(ip: str) -> str:
+    """IPv4 アドレスとして正しいか確認する。SG に開けるアドレスなので不正な値は拒否する。"""
+    try:
+        return str(ipaddress.IPv4Address(ip))
+    except ValueError:
+        raise ValueError(f"IPv4 アドレスではありません: {ip!r}")
+
+
+def fetch_public_ip(url: str = CHECKIP_URL, timeout: float = 10.0) -> str:
+    """グローバル IP アドレスを 1 回だけ取得する。"""
+    with urllib.request.urlopen(url, timeout=timeout) as res:
+        ip = res.read().decode("utf-8").strip()
+    return validate_ip(ip)
+
+
+def positive_int(value: str) -> int:
+    """argparse 用: 1 以上の整数だけを受け付ける。"""
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"1 以上の値を指定してください: {value}")
+    return n
+
+
+def load_config(path: str) -> Dict:
+    """設定ファイル (JSON) を読み込み、最低限の検証をする。"""
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    groups = config.get("groups")
+    if not groups:
+        raise ValueError("設定ファイルに groups がありません。")
+    for g in groups:
+        for key in ("region", "group_id", "ports"):
+            if key not in g:
+                raise ValueError(f"groups の要素に {key} がありません: {g}")
+    return config
+
+
+def desired_rules(groups: List[Dict], cidr: str) -> Set[Rule]:
+    """同じ SG に対する設定エントリをまとめ、あるべき ingress ルールの集合を作る。"""
+    rules: Set[Rule] = set()
+    for group in groups:
+        protocol = group.get("protocol", "tcp")
+        rules |= {(protocol, int(port), int(port), cidr) for port in group["ports"]}
+    return rules
+
+
+def existing_rules(sg: Dict, description: Optional[str] = None) -> Set[Rule]:
+    """describe の結果からルールを取り出す。
+
+    description を指定した場合は、それが一致する (管理対象の) ルールだけを返す。
+    全トラフィック (IpProtocol "-1") などポート範囲のないルールは、ポートを None とする。
+    """
+    rules: Set[Rule] = set()
+    for perm in sg.get("IpPermissions", []):
+        protocol = perm.get("IpProtocol")
+        from_port = perm.get("FromPort")
+        to_port = perm.get("ToPort")
+        for ip_range in perm.get("IpRanges", []):
+            if description is None or ip_range.get("Description") == description:
+                rules.add((protocol, from_port, to_port, ip_range["CidrIp"]))
+    return rules
+
+
+def to_ip_permissions(rules: Set[Rule], description: str) -> List[Dict]:
+    """ルールの集合を API に渡す IpPermissions に変換する。
+
+    同じ (protocol, port) の CIDR はまとめ、1 回の API 呼び出しで全ルールを送る。
+    ポートが None のルールは FromPort / ToPort を付けずに送る。
+    """
+    merged: Dict[Tuple[str, int, int], List[str]] = {}
+    for protocol, from_port, to_port, cidr in sorted(rules):
+        merged.setdefault((protocol, from_port, to_port), []).append(cidr)
+
+    permissions = []
+    for (protocol, from_port, to_port), cidrs in merged.items():
+        perm = {
+            "IpProtocol": protocol,
+            "IpRanges": [{"CidrIp": cidr, "Description": description} for cidr in cidrs],
+        }
+        if from_port is not None:
+            perm["FromPort"] = from_port
+        if to_port is not None:
+            perm["ToPort"] = to_port
+        permissions.append(perm)
+    return permissions
+
+
+def describe_groups(client, group_ids: List[str]) -> Dict[str, Dict]:
+    """リージョン内の対象 SG をまとめて 1 回の describe で取得する。
+
+    GroupIds で指定すると存在しない ID が 1 つあるだけで全体が失敗するため、
+    フィルタで指定して存在しない SG は結果から落とす。
+    """
+    res = client.describe_security_groups(Filters=[{"Name": "group-id", "Values": group_ids}])
+    return {sg["GroupId"]: sg for sg in res["SecurityGroups"]}
+
+
+def reconcile_group(client, group_id: str, sg: Dict, desired: Set[Rule], description: str,
+                    dry_run: bool = False) -> Tuple[Set[Rule], Set[Rule]]:
+    """1 つの SG について差分を計算し、revoke / authorize を最大 1 回ずつ呼ぶ。"""
+    to_revoke = existing_rules(sg, description) - desired
+    # 管理対象外のルールとして既に許可されているものは追加しない (InvalidPermission.Duplicate になる)
+    to_authorize = desired - existing_rules(sg)
+
+    if dry_run:
+        return to_revoke, to_authorize
+
+    # 先に追加してから古いルールを削除し、アクセスできない時間を作らない
+    if to_authorize:
+        client.authorize_security_group_ingress(
+            GroupId=group_id,
+            IpPermissions=to_ip_permissions(to_authorize, description),
+        )
+    if to_revoke:
+        client.revoke_security_group_ingress(
+            GroupId=group_id,
+            IpPermissions=to_ip_permissions(to_revoke, description),
+        )
+    return to_revoke, to_authorize
+
+
+def reconcile(config: Dict, cidr: str, endpoint_url: Optional[str] = None, max_workers: int = 8,
+              dry_run: bool = False) -> bool:
+    """全 SG を並列に reconcile する。すべて成功したら True を返す。"""
+    session = boto3.session.Session(profile_name=config.get("profile"))
+    description = config.get("description", DEFAULT_DESCRIPTION)
+
+    # 同じ SG に対するエントリは 1 つにまとめ、SG ごとに 1 回だけ reconcile する
+    by_sg: Dict[Tuple[str, str], List[Dict]] = {}
+    for g in config["groups"]:
+        by_sg.setdefault((g["region"], g["group_id"]), []).append(g)
+    by_region: Dict[str, List[str]] = {}
+    for region, group_id in by_sg:
+        by_region.setdefault(region, []).append(group_id)
+    # client はスレッドセーフなので、リージョンごとに 1 つ作って共有する
+    clients = {
+        region: session.client("ec2", region_name=region, endpoint_url=endpoint_url)
+        for region in by_region
+    }
+
+    ok = True
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # describe はリージョン単位でまとめて並列に実行する
+        described = {
+            executor.submit(describe_groups, clients[region], group_ids): region
+            for region, group_ids in by_region.items()
+        }
+        futures = {}
+        for future in as_completed(described):
+            region = described[future]
+            try:
+                sgs = future.result()
+            except Exception as e:
+                print(f"[error] {region}: describe に失敗しました: {e}", file=sys.stderr)
+                ok = False
+                continue
+            for group_id in by_region[region]:
+                sg = sgs.get(group_id)
+                if sg is None:
+                    print(f"[error] {region}/{group_id}: SG が見つかりません", file=sys.stderr)
+                    ok = False
+                    continue
+                desired = desired_rules(by_sg[(region, group_id)], cidr)
+                futures[executor.submit(reconcile_group, clients[region], group_id, sg,
+                                        desired, description, dry_run)] = f"{region}/{group_id}"
+
+        for future in as_completed(futures):
+            label = futures[future]
+            try:
+                revoked, authorized = future.result()
+            except Exception as e:
+                print(f"[error] {label}: {e}", file=sys.stderr)
+                ok = False
+                continue
+            if not revoked and not authorized:
+                print(f"[info] {label}: 変更なし")
+                continue
+            prefix = "[dry-run] " if dry_run else "[info] "
+            for protocol, from_port, _, rule_cidr in sorted(revoked):
+                print(f"{prefix}{label}: revoke {protocol}/{from_port} {rule_cidr}")
+            for protocol, from_port, _, rule_cidr in sorted(authorized):
+                print(f"{prefix}{label}: authorize {protocol}/{from_port} {rule_cidr}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="設定ファイルに書かれた複数の SG / ポート / リージョンに現在の IP アドレスを反映する"
+    )
+    parser.add_argument("-c", "--config", default="sg_config.json", help="設定ファイル (JSON) のパス")
+    parser.add_argument("--ip", default=None, help="反映する IPv4 アドレス。未指定なら https://checkip.amazonaws.com/ から取得")
+    parser.add_argument("--endpoint-url", default=None, help="EC2 API のエンドポイント (ローカルのモックサーバなど)")
+    parser.add_argument("-j", "--max-workers", type=positive_int, default=8, help="同時に処理する SG の数")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="差分の表示のみ行い、変更はしない")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    try:
+        ip = validate_ip(args.ip) if args.ip else fetch_public_ip()
+    except (OSError, ValueError) as e:
+        print(f"[error] {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"current ip address: {ip}")
+
+    ok = reconcile(config, f"{ip}/32", endpoint_url=args.endpoint_url,
+                   max_workers=args.max_workers, dry_run=args.dry_run)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,14 +13,14 @@ if [ -e myip.txt ]; then
 	fi
 	echo "not equal current ip address and pre ip address. $PREIP (pre ip) is not $MYIP (current ip)."
   # アドレスが変わっているため、設定していたアドレスを sg から除外する
-	aws --profile root ec2 revoke-security-group-ingress --group-id $MYSECGROUP --protocol tcp --port 22 --cidr $MYIP/32
+	aws --profile root ec2 revoke-security-group-ingress --group-id $MYSECGROUP --protocol tcp --port 22 --cidr $PREIP/32
 	rm ./myip.txt
 else
         echo "not found ./myip.txt. So, create file named myip.txt."
 fi
 
 # 現在のアドレスを myip.txt に書き込む
-curl -s -o ./myip.txt http://checkip.amazonaws.com/
+echo "$MYIP" > ./myip.txt
 # 現在の新しいアドレスを sg に設定する
 aws --profile root ec2 authorize-security-group-ingress --group-id $MYSECGROUP --protocol tcp --port 22 --cidr $MYIP/32
 
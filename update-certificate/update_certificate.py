@@ -0,0 +1,141 @@
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from cryptography import x509
+
+LIVE_DIR = "/etc/letsencrypt/live"
+CERT_FILE = "cert.pem"
+
+
+def list_cert_names(live_dir: str) -> List[str]:
+    """certbot の live ディレクトリから証明書名 (ドメイン名) の一覧を取得する。"""
+    names = []
+    for name in sorted(os.listdir(live_dir)):
+        if os.path.isfile(os.path.join(live_dir, name, CERT_FILE)):
+            names.append(name)
+    return names
+
+
+def remain_days(cert_path: str, now: Optional[datetime] = None) -> int:
+    """証明書ファイルを直接読み、有効期限までの残り日数を返す。"""
+    with open(cert_path, "rb") as f:
+        cert = x509.load_pem_x509_certificate(f.read())
+    now = now or datetime.now(timezone.utc)
+    return (cert.not_valid_after_utc - now).days
+
+
+def check(live_dir: str, name: str, now: datetime) -> Tuple[str, Optional[int]]:
+    """1 つの証明書の残り日数を返す。読み込めない場合は None を返す。"""
+    try:
+        return name, remain_days(os.path.join(live_dir, name, CERT_FILE), now)
+    except (OSError, ValueError) as e:
+        print(f"[error] {name}: {e}", file=sys.stderr)
+        return name, None
+
+
+def scan(live_dir: str, max_workers: int = 8) -> List[Tuple[str, Optional[int]]]:
+    """live ディレクトリ内のすべての証明書の残り日数を並列に取得する。
+
+    読み込めない証明書があっても、他の証明書の確認は続ける。
+    """
+    names = list_cert_names(live_dir)
+    now = datetime.now(timezone.utc)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda name: check(live_dir, name, now), names))
+
+
+def run(cmd: List[str]) -> bool:
+    """コマンドを実行し、成功したかどうかを返す。コマンドが見つからない場合も失敗とする。"""
+    print(f"[info] run: {shlex.join(cmd)}", flush=True)
+    try:
+        return subprocess.run(cmd).returncode == 0
+    except OSError as e:
+        print(f"[error] {cmd[0]} を実行できません: {e}", file=sys.stderr)
+        return False
+
+
+def positive_int(value: str) -> int:
+    """argparse 用: 1 以上の整数だけを受け付ける。"""
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"1 以上の値を指定してください: {value}")
+    return n
+
+
+def renew(certbot: str, names: List[str]) -> List[str]:
+    """期限の近い証明書だけを更新し、更新できた証明書名を返す。
+
+    certbot renew の --cert-name は 1 つしか指定できないため、証明書ごとに
+    certbot を実行する (certbot はロックを取るため並列にも実行できない)。
+    サービスの reload は全件の更新が終わってから 1 回だけ行う。
+    """
+    renewed = []
+    for name in names:
+        cmd = shlex.split(certbot) + ["renew", "--cert-name", name, "--force-renewal"]
+        if run(cmd):
+            renewed.append(name)
+        else:
+            print(f"[error] {name} の更新に失敗しました。", file=sys.stderr)
+    return renewed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="certbot の live ディレクトリ内の全証明書の期限を確認し、期限の近いものだけを更新して reload する"
+    )
+    parser.add_argument("-d", "--live-dir", default=LIVE_DIR, help="certbot の live ディレクトリ")
+    parser.add_argument("-t", "--threshold", type=int, default=45, help="残り日数がこの値未満なら更新する")
+    parser.add_argument("--certbot", default="certbot", help="certbot コマンド")
+    parser.add_argument("--test-cmd", default="nginx -t", help="reload 前に実行する設定チェックのコマンド")
+    parser.add_argument("--reload-cmd", default="systemctl reload nginx", help="更新後に実行する reload コマンド")
+    parser.add_argument("-j", "--max-workers", type=positive_int, default=8, help="同時に読み込む証明書の数")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="残り日数の表示のみ行い、更新はしない")
+    args = parser.parse_args()
+
+    try:
+        results = scan(args.live_dir, max_workers=args.max_workers)
+    except OSError as e:
+        print(f"[error] {args.live_dir} を読み込めません: {e}", file=sys.stderr)
+        sys.exit(1)
+    if not results:
+        print(f"[info] {args.live_dir} に証明書がありません。")
+        sys.exit(0)
+
+    targets = []
+    failed = [name for name, days in results if days is None]
+    for name, days in results:
+        if days is None:
+            continue
+        print(f"{name}: {days} days")
+        if days < args.threshold:
+            targets.append(name)
+
+    if not targets:
+        print("There is no need to renew the certificate.")
+        sys.exit(1 if failed else 0)
+    if args.dry_run:
+        print(f"[dry-run] renew: {', '.join(targets)}")
+        sys.exit(1 if failed else 0)
+
+    print("start updating the certificate.")
+    renewed = renew(args.certbot, targets)
+    if renewed:
+        # 設定に問題があれば reload せず、稼働中のプロセスをそのまま残す
+        if not run(shlex.split(args.test_cmd)):
+            print("[error] 設定チェックに失敗したため reload しません。", file=sys.stderr)
+            sys.exit(1)
+        if not run(shlex.split(args.reload_cmd)):
+            print("[error] reload に失敗しました。", file=sys.stderr)
+            sys.exit(1)
+    print("finish updating the certificate.")
+    sys.exit(0 if len(renewed) == len(targets) and not failed else 1)
+
+
+if __name__ == "__main__":
+    main()